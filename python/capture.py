@@ -1,4 +1,6 @@
 import base64
+import binascii
+import functools
 import math
 import os
 import sys
@@ -6,7 +8,7 @@ import threading
 import time
 import warnings
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Callable, Deque, List, Optional, Tuple
 
 import cv2  # type: ignore
 import numpy as np  # type: ignore
@@ -37,30 +39,85 @@ sys.stderr = _StderrFilter(sys.stderr)
 from persistence import (
     IMAGES_DIR,
     MAX_DETECTION_IMAGES,
-    delete_oldest_detection,
-    save_detection_to_log,
+    delete_oldest_detections,
+    queue_detection_write,
 )
 from health_monitor import restart_video_runner_container
 
+# libjpeg-turbo (SIMD) decoder; falls back to cv2.imdecode if the wheel or
+# the shared library is missing on the board
+try:
+    import turbojpeg  # type: ignore
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420  # type: ignore
+    # Progressive scans also get optimized Huffman tables from libjpeg-turbo
+    _TJFLAG_PROGRESSIVE = getattr(turbojpeg, "TJFLAG_PROGRESSIVE", 0)
+    _tj = TurboJPEG()
+except Exception as e:
+    print(f"[CAPTURE] TurboJPEG unavailable ({e}); using cv2.imdecode")
+    _tj = None
+
+# SIMD base64 (AVX2/NEON) when pybase64 is installed. binascii is the fallback:
+# both take memoryviews and ASCII str without copying and skip stray whitespace
+try:
+    from pybase64 import b64decode as _pybase64_decode  # type: ignore
+
+    def _b64decode(data):
+        return _pybase64_decode(data, validate=False)
+except ImportError:
+    _b64decode = binascii.a2b_base64
+
+# Numba is optional: when installed, single-box scaling runs as a compiled kernel
+try:
+    from numba import njit  # type: ignore
+except ImportError:
+    njit = None
+
 # Use environment variables if available, otherwise defaults
 VIDEO_STREAM_PORT = int(os.environ.get("VIDEO_RUNNER_PORT", 4912))
 VIDEO_WS_HOST = os.environ.get("VIDEO_RUNNER_HOST", "ei-video-obj-detection-runner")
 MODEL_INPUT_SIZE = 416  # YOLO input dimension used by the Brick
+SAVE_JPEG_QUALITY = 80  # Detection thumbnails; no visible loss at UI size, far fewer bytes than 95
+SAVE_MAX_DIM = 640  # Saved detection images are downscaled so their longest side fits this
 
 # Log configuration on startup
 print(f"[CAPTURE] Config: HOST={VIDEO_WS_HOST}, PORT={VIDEO_STREAM_PORT}")
 
 # Frame capture state
 _sio_initialized = False
+# All internal timing uses the monotonic clock, so NTP steps or a late RTC sync
+# cannot make the stream look stale (or fresh) and trigger spurious reconnects
+_now = time.monotonic
 _latest_frame = None
 _latest_frame_time = 0.0
+_frame_gen = 0  # Bumped on every published frame so readers can spot a newer one
+# Newest frame as received. Only the JPEG bytes are stored per frame; the first
+# capture_frame() call for a generation decodes them into _latest_frame, so
+# frames nobody asks for are never decoded.
+_latest_jpeg = None
+# Event name that delivered the first frame on this connection; other events are then
+# ignored without inspecting their payload
+_frame_event = None
 _sio_connected = False
 _sio_client = None
-_last_connect_attempt = 0.0
+_last_connect_attempt = -math.inf  # monotonic; -inf means "attempt now"
 _reconnect_interval = 5.0
 _reconnector_started = False
-_stale_watchdog_started = False
 _connect_lock = threading.Lock()
+_wake = threading.Event()        # Wakes the stream supervisor early (disconnect, reconnect request)
+_connected_evt = threading.Event()  # Set by the connect handler; replaces a fixed post-connect sleep
+_frame_lock = threading.Lock()   # Guards _latest_frame/_latest_frame_time/_latest_jpeg (Socket.IO thread vs readers)
+_decode_lock = threading.Lock()  # Serializes lazy decodes and the reads of the buffer they fill
+# A data-URI prefix ("data:image/jpeg;base64,") always sits at the start of a
+# payload, so only this many leading characters are searched for the marker
+_B64_PREFIX_SCAN = 64
+_B64_MARKER = "base64,"
+_B64_MARKER_BYTES = b"base64,"
+_JPEG_SOI = b"\xff\xd8"  # JPEG start-of-image marker
+# Reusable decode target, so steady-state decoding allocates no new frames.
+# Only a frame nobody can still read is overwritten: readers copy it under
+# _decode_lock, and a frame handed out by capture_frame(copy=False) is detached
+# (the next decode allocates a replacement).
+_frame_buf = None
 _connection_attempt_count = 0  # Track attempts for log throttling
 
 # Stream health stats (diagnostic counters)
@@ -76,6 +133,26 @@ _connection_uptime_start = 0.0  # When the current connection session started
 # Connection URL
 _video_url = f"http://{VIDEO_WS_HOST}:{VIDEO_STREAM_PORT}"
 
+
+def _pick_sio_transports() -> List[str]:
+    """Connect straight over WebSocket when websocket-client is installed.
+
+    That skips the long-polling handshake and upgrade. Without the package
+    python-socketio can only poll, so polling is requested explicitly.
+    VIDEO_SIO_TRANSPORTS (comma-separated) overrides the choice.
+    """
+    override = os.environ.get("VIDEO_SIO_TRANSPORTS", "").strip()
+    if override:
+        return [t.strip() for t in override.split(",") if t.strip()]
+    try:
+        import websocket  # type: ignore  # noqa: F401
+        return ["websocket"]
+    except ImportError:
+        return ["polling"]
+
+
+_sio_transports = _pick_sio_transports()
+
 # Staleness handling
 STALE_FRAME_MAX_AGE = 10.0  # seconds (increased from 5.0 for stability)
 FRESH_RETRY_TOTAL = 5.0    # seconds – enough time for reconnect + first frame arrival
@@ -85,6 +162,9 @@ STALE_RECONNECT_AGE = 30.0  # seconds (increased from 15.0 for stability)
 STALE_CHECK_INTERVAL = 5.0  # seconds
 WATCHDOG_MAX_OFFLINE = 300.0 # 5 minutes max offline time before self-restart
 
+# Month abbreviations for detection timestamps (avoids locale-aware strftime)
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
 def _setup_socketio():
     """Set up Socket.IO client for video stream."""
     global _sio_client, _sio_connected, _latest_frame
@@ -94,20 +174,22 @@ def _setup_socketio():
         import engineio  # type: ignore
 
         # Set logger=False and engineio_logger=False to keep the terminal clean
-        # Configure for stable polling transport with appropriate timeouts
+        # Transports are chosen once at import (see _pick_sio_transports)
         # Disable auto-reconnection so we can manage the lifecycle manually ("nuclear option")
         _sio_client = socketio.Client(
             logger=False, 
             engineio_logger=False,
             reconnection=False,  # We handle reconnection manually
-            request_timeout=10   # Shorter timeout
+            request_timeout=5    # Fail fast; the supervisor retries
         )
 
         @_sio_client.event
         def connect():
-            global _sio_connected, _connection_uptime_start
+            global _sio_connected, _connection_uptime_start, _frame_event
             _sio_connected = True
-            _connection_uptime_start = time.time()
+            _frame_event = None  # Re-learned from the first frame of this connection
+            _connection_uptime_start = _now()
+            _connected_evt.set()
             # Log transport and ping settings for diagnostics
             transport = "unknown"
             ping_info = ""
@@ -133,27 +215,20 @@ def _setup_socketio():
             global _sio_connected, _disconnects_in_window, _last_disconnect_time
             was_connected = _sio_connected
             _sio_connected = False
-            now = time.time()
+            now = _now()
             with _stats_lock:
                 _disconnects_in_window += 1
                 _last_disconnect_time = now
             if was_connected:
                 uptime = now - _connection_uptime_start if _connection_uptime_start > 0 else 0
                 print(f"[CAPTURE] ✗ Socket.IO disconnected (was connected {uptime:.1f}s)")
+            # Let the supervisor start reconnecting now rather than on its next tick
+            _wake.set()
 
         @_sio_client.on("*")
         def catch_all(event, *args):
-            """Catch all events to find frame data."""
-            global _latest_frame
-            had_frame = _latest_frame is not None
-            
-            # Process all arguments passed with the event
-            for arg in args:
-                _process_frame_data(arg)
-            
-            # Log first frame received (helpful for debugging)
-            if not had_frame and _latest_frame is not None:
-                print(f"[CAPTURE] ✓ First frame received via event: {event}")
+            """Store the frame carried by the frame event (any event until it is known)."""
+            _handle_frame_event(event, args)
 
         return True
     except ImportError:
@@ -164,59 +239,195 @@ def _setup_socketio():
         return False
 
 
+def _handle_frame_event(event, args):
+    """Store the frame an event carries.
+
+    Runs on the Socket.IO thread. Only the JPEG bytes are kept (decoding waits
+    for a capture_frame() call), so nothing here can stall the socket.
+    """
+    global _frame_event
+    if _frame_event is not None and event != _frame_event:
+        return
+
+    # Process all arguments passed with the event
+    stored = False
+    for arg in args:
+        stored = _process_frame_data(arg) or stored
+
+    # Log (once per connection) which event carries frames, and only accept that one from now on.
+    # Learned only from a payload that validated as a frame, never from a stray text event.
+    if _frame_event is None and stored:
+        _frame_event = event
+        print(f"[CAPTURE] ✓ Frames arrive via event: {event}")
+
+
+def _pooled_frame_buffer(shape, dtype=np.uint8):
+    """Return the reusable frame buffer, (re)allocated for shape and dtype.
+
+    Reallocated only when the stream resolution changes or after a
+    capture_frame(copy=False) detached it. Callers hold _decode_lock.
+    """
+    global _frame_buf
+    buf = _frame_buf
+    if buf is None or buf.shape != shape or buf.dtype != dtype:
+        buf = np.empty(shape, dtype)
+        _frame_buf = buf
+    return buf
+
+
+def _store_frame(frame, jpeg=None):
+    """Publish a new frame and update stream stats.
+
+    JPEG payloads pass ``frame=None`` and are decoded on first capture; raw
+    arrays are published as ``frame`` with no JPEG.
+    """
+    global _latest_frame, _latest_frame_time, _latest_jpeg, _frame_gen
+    global _frames_received, _last_frame_gap, _prev_frame_time
+    now = _now()
+    with _frame_lock:
+        _latest_frame = frame
+        _latest_jpeg = jpeg
+        _latest_frame_time = now
+        _frame_gen += 1
+    with _stats_lock:
+        _frames_received += 1
+        if _prev_frame_time > 0:
+            gap = now - _prev_frame_time
+            if gap > _last_frame_gap:
+                _last_frame_gap = gap
+        _prev_frame_time = now
+
+
 def _process_frame_data(data):
-    """Process incoming frame data from Socket.IO."""
-    global _latest_frame, _latest_frame_time, _frames_received, _last_frame_gap, _prev_frame_time
+    """Process incoming frame data from Socket.IO.
+
+    Binary JPEG events are the expected format and take the first branch; dict
+    and base64 payloads (data-URI strings) are kept as a legacy fallback.
+    Returns True if a frame was published.
+    """
     try:
-        # If data is already a numpy array (e.g. from a brick directly)
+        # Binary Socket.IO attachment: raw JPEG bytes, nothing to unwrap
+        if type(data) is bytes and data[:2] == _JPEG_SOI:
+            _store_frame(None, data)
+            return True
+
+        # If data is already a numpy array (e.g. from a brick directly), copy it
+        # into the pooled buffer; the decode lock keeps readers off it meanwhile
         if isinstance(data, np.ndarray):
-            now = time.time()
-            _latest_frame = data.copy()
-            _latest_frame_time = now
-            with _stats_lock:
-                _frames_received += 1
-                if _prev_frame_time > 0:
-                    gap = now - _prev_frame_time
-                    if gap > _last_frame_gap:
-                        _last_frame_gap = gap
-                _prev_frame_time = now
-            return
-
-        # data might be the dict or the raw base64 string
-        img_data = None
+            with _decode_lock:
+                buf = _pooled_frame_buffer(data.shape, data.dtype)
+                np.copyto(buf, data)
+                _store_frame(buf)
+            return True
+
+        # data might be the dict, raw JPEG bytes or a base64 string
+        img_data = data
         if isinstance(data, dict):
             # Find image data using any common key
             img_data = next(
                 (data[k] for k in ["frame", "image", "data", "img", "jpeg", "jpg", "png"] if k in data),
                 None
             )
-        elif isinstance(data, str):
-            img_data = data
-        
-        if not isinstance(img_data, str):
-            return
-
-        # Strip base64 prefix if present
-        if "base64," in img_data:
-            img_data = img_data.split("base64,", 1)[1]
-        
-        # Decode and convert to frame
-        img_bytes = base64.b64decode(img_data)
-        frame = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
-        
-        if frame is not None:
-            now = time.time()
-            _latest_frame = frame
-            _latest_frame_time = now
-            with _stats_lock:
-                _frames_received += 1
-                if _prev_frame_time > 0:
-                    gap = now - _prev_frame_time
-                    if gap > _last_frame_gap:
-                        _last_frame_gap = gap
-                _prev_frame_time = now
+
+        if isinstance(img_data, (bytes, bytearray, memoryview)):
+            # Binary payload: raw JPEG unless it carries a data-URI prefix
+            prefix_end = bytes(img_data[:_B64_PREFIX_SCAN]).find(_B64_MARKER_BYTES)
+            if prefix_end >= 0:
+                # memoryview slice: no copy of the payload before decoding
+                img_bytes = _b64decode(
+                    memoryview(img_data)[prefix_end + len(_B64_MARKER_BYTES):]
+                )
+            elif img_data[:2] != _JPEG_SOI:
+                # Possibly a batch of frames; only the newest one is kept
+                batched = _newest_batched_jpeg(img_data)
+                img_bytes = batched if batched is not None else img_data
+            else:
+                img_bytes = img_data
+        elif isinstance(img_data, str):
+            # Strip base64 prefix if present (bounded search, not a full-payload scan)
+            prefix_end = img_data.find(_B64_MARKER, 0, _B64_PREFIX_SCAN)
+            if prefix_end >= 0:
+                img_data = img_data[prefix_end + len(_B64_MARKER):]
+            # Decoded straight from the str: no .encode() copy or whitespace
+            # translate() pass is needed first
+            img_bytes = _b64decode(img_data)
+        else:
+            return False
+
+        # Other image formats (e.g. PNG) are decoded here and published as a
+        # frame; anything cv2 rejects (e.g. a text message on the same event)
+        # is dropped rather than published
+        if img_bytes[:2] != _JPEG_SOI:
+            frame = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                return False
+            _store_frame(frame)
+            return True
+
+        # Owned bytes: a memoryview would pin (and alias) the whole Socket.IO message
+        _store_frame(None, img_bytes if isinstance(img_bytes, bytes) else bytes(img_bytes))
+        return True
     except Exception:
-        pass
+        return False
+
+
+def _newest_batched_jpeg(buf):
+    """Return the last JPEG of a batched payload, or None if buf is not one.
+
+    A batch is a run of ``<uint32 little-endian length><JPEG>`` records in a
+    single binary message, which lets a sender amortize per-message overhead.
+    Older frames in the batch would be superseded anyway, so they are skipped
+    without decoding.
+    """
+    view = memoryview(buf)
+    n = len(view)
+    off = 0
+    last = None
+    while off + 4 <= n:
+        size = int.from_bytes(view[off:off + 4], "little")
+        start = off + 4
+        end = start + size
+        if size < 2 or end > n or view[start:start + 2] != _JPEG_SOI:
+            return None
+        last = view[start:end]
+        off = end
+    return last if off == n else None
+
+
+def _decode_jpeg(img_bytes):
+    """Decode JPEG bytes to a BGR frame, preferring TurboJPEG over cv2."""
+    if _tj is not None:
+        try:
+            width, height, _, _ = _tj.decode_header(img_bytes)
+            buf = _pooled_frame_buffer((height, width, 3))
+            return _tj.decode(img_bytes, pixel_format=TJPF_BGR, dst=buf)
+        except Exception:
+            pass
+    return cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
+
+
+def _encode_jpeg(frame, quality: int = SAVE_JPEG_QUALITY, optimize: bool = False):
+    """Encode a BGR frame to JPEG (4:2:0), preferring TurboJPEG over cv2.
+
+    ``optimize`` writes a progressive JPEG with optimized Huffman tables:
+    a few percent smaller for some extra encode time, worth it for files
+    kept on disk and served to the WebUI.
+    """
+    if _tj is not None:
+        try:
+            return _tj.encode(
+                frame, quality=quality, pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420,
+                flags=_TJFLAG_PROGRESSIVE if optimize else 0,
+            )
+        except Exception:
+            pass
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    if optimize:
+        params += [cv2.IMWRITE_JPEG_OPTIMIZE, 1, cv2.IMWRITE_JPEG_PROGRESSIVE, 1]
+    ok, buf = cv2.imencode('.jpg', frame, params)
+    if not ok:
+        raise RuntimeError("cv2.imencode failed")
+    return buf
 
 
 def _frame_age(now: float) -> float:
@@ -246,8 +457,12 @@ def _connect_socketio():
         should_log = _connection_attempt_count <= 1 or _connection_attempt_count % 5 == 0
 
         try:
-            _sio_client.connect(_video_url, wait_timeout=5)
-            time.sleep(0.5)
+            _connected_evt.clear()
+            _sio_client.connect(
+                _video_url, transports=_sio_transports, socketio_path="socket.io", wait_timeout=5
+            )
+            # connect() normally returns after the handler ran; only wait if it has not
+            _connected_evt.wait(0.5)
 
             if _sio_connected:
                 if should_log:
@@ -289,68 +504,164 @@ def _connect_socketio():
         return False
 
 
-def capture_frame():
-    """Capture a single frame from the video stream via Socket.IO."""
-    global _latest_frame, _sio_connected, _latest_frame_time, _last_connect_attempt
+def capture_frame(out=None, copy: bool = True):
+    """Capture a single frame from the video stream via Socket.IO.
 
-    now = time.time()
+    Returns a private copy of the latest frame. If ``out`` is an array of the
+    same shape and dtype, the frame is copied into it instead of allocating.
+    With ``copy=False`` the published frame itself is returned read-only and
+    detached from the decode buffer, which skips the memcpy for callers that only
+    read it; compare frame_generation() to tell whether a newer frame arrived.
+    The first call for a frame decodes its JPEG; later calls reuse the result.
+    """
+    return _capture_frame_and_jpeg(out, copy)[0]
+
+
+def _capture_frame_and_jpeg(out=None, copy: bool = True):
+    """capture_frame() that also returns the JPEG bytes the frame was decoded from.
+
+    Both are read for the same frame generation, so the JPEG matches the pixels
+    even if a newer frame lands meanwhile. Returns (None, None) when no fresh
+    frame is available; the JPEG is None for frames that arrived unencoded.
+    """
+    global _sio_connected, _latest_frame, _frame_buf
+
+    now = _now()
 
     # NOTE: Synchronous connection attempts here were causing massive lag.
-    # We now rely STRICTLY on the background thread (_reconnect_loop) to handle connections.
+    # We now rely STRICTLY on the background thread (_stream_supervisor_loop) to handle connections.
     # This function is now non-blocking and only returns a frame if one is available.
     
     if not _sio_connected:
-        return None
+        return None, None
+
+    # The copy is taken under the decode lock: the next decode reuses the
+    # frame buffer, so it must not be read mid-decode
+    with _decode_lock:
+        with _frame_lock:
+            frame, jpeg, gen = _latest_frame, _latest_jpeg, _frame_gen
+            age = _frame_age(now)
+        has_frame = frame is not None or jpeg is not None
+        if frame is None and jpeg is not None and age <= STALE_FRAME_MAX_AGE:
+            frame = _decode_jpeg(jpeg)
+            if frame is not None:
+                with _frame_lock:
+                    # Cache for later readers unless a newer JPEG landed meanwhile
+                    if _frame_gen == gen:
+                        _latest_frame = frame
+        if frame is not None and age <= STALE_FRAME_MAX_AGE:
+            if out is not None and out.shape == frame.shape and out.dtype == frame.dtype:
+                np.copyto(out, frame)
+                return out, jpeg
+            if not copy:
+                # The next decode allocates a replacement for the detached buffer
+                if frame is _frame_buf:
+                    _frame_buf = None
+                frame.setflags(write=False)
+                return frame, jpeg
+            return frame.copy(), jpeg
+
+    if has_frame:
+        # Stale frame, treat as unavailable to force retry
+        # Only log excessively stale frames once in a while to avoid spam
+        if age > 10.0 and int(age) % 5 == 0:
+            print(f"[CAPTURE] Stale frame age={age:.1f}s; ignoring")
+
+        # If the frame is EXTREMELY stale (e.g. > 10s), force a disconnect
+        if age > 10.0 and _sio_connected:
+            print(f"[CAPTURE] Frame extremely stale ({age:.1f}s); forcing disconnect")
+            try:
+                _sio_connected = False
+                if _sio_client:
+                    _sio_client.disconnect()
+            except Exception:
+                pass
+            # Trigger immediate reconnect attempt
+            _request_reconnect()
 
-    # If the frame is reasonably fresh (e.g. from working socketio), use it
-    if _latest_frame is not None:
-        age = _frame_age(now)
-        if age < 1.0:
-            return _latest_frame.copy()
-            
-
-    # Use stale frame if within acceptable limits
-    if _latest_frame is not None:
-        age = _frame_age(now)
-        if age <= STALE_FRAME_MAX_AGE:
-            return _latest_frame.copy()
-        else:
-            # Stale frame, treat as unavailable to force retry
-            # Only log excessively stale frames once in a while to avoid spam
-            if age > 10.0 and int(age) % 5 == 0:
-                print(f"[CAPTURE] Stale frame age={age:.1f}s; ignoring")
-
-            # If the frame is EXTREMELY stale (e.g. > 10s), force a disconnect
-            if age > 10.0 and _sio_connected:
-                print(f"[CAPTURE] Frame extremely stale ({age:.1f}s); forcing disconnect")
-                try:
-                    _sio_connected = False
-                    if _sio_client:
-                        _sio_client.disconnect()
-                except Exception:
-                    pass
-                # Trigger immediate reconnect attempt
-                _last_connect_attempt = 0.0
+    return None, None
+
+
+def frame_generation() -> int:
+    """Return the number of frames published so far (changes whenever a new frame lands)."""
+    return _frame_gen
+
+
+def _request_reconnect():
+    """Ask the stream supervisor to attempt a reconnect right away."""
+    global _last_connect_attempt
+    _last_connect_attempt = -math.inf
+    _wake.set()
+
+
+def _check_stale_stream(now: float):
+    """Force reconnect if we appear connected but no fresh frames arrive for too long."""
+    global _latest_frame, _latest_frame_time, _latest_jpeg, _last_connect_attempt, _sio_connected, _sio_client
+    age = _frame_age(now)
+
+    # Don't kill connection if we JUST connected (within STALE_RECONNECT_AGE)
+    # This gives time for the first frame to arrive
+    connection_age = now - _last_connect_attempt
+    if connection_age < STALE_RECONNECT_AGE:
+        return
+
+    # If we think we are connected but the client says otherwise, or if frames are too old
+    client_connected_status = False
+    if _sio_client is not None:
+        try:
+            client_connected_status = _sio_client.connected
+        except:
+            pass
+
+    needs_reconnect = (_sio_connected and age > STALE_RECONNECT_AGE) or \
+                      (_sio_connected and _sio_client is not None and not client_connected_status)
 
-    return None
+    if needs_reconnect:
+        print(f"[CAPTURE] Stale frame ({age:.1f}s), reconnecting...")
 
+        try:
+            _sio_connected = False
+            if _sio_client is not None:
+                _sio_client.disconnect()
+        except Exception as e:
+            print(f"[CAPTURE] Reconnect error: {e}")
 
-def _reconnect_loop():
-    """Background reconnect loop to recover the video stream when idle.
-       Implements exponential backoff to reduce load during extended outages.
+        _sio_client = None
+        with _frame_lock:
+            _latest_frame = None
+            _latest_jpeg = None
+            _latest_frame_time = 0.0
+        # Trigger immediate reconnect attempt
+        _last_connect_attempt = now - _reconnect_interval
+
+
+def _stream_supervisor_loop():
+    """Background loop that keeps the video stream alive.
+
+    Reconnects with exponential backoff while disconnected, restarts the video
+    runner after a long outage, and checks for stale frames every
+    STALE_CHECK_INTERVAL. Sleeps on _wake, so a disconnect or reconnect
+    request is handled immediately instead of on the next tick.
     """
-    global _sio_initialized, _last_connect_attempt, _sio_connected
-    
+    global _sio_initialized, _last_connect_attempt
+
     current_wait = _reconnect_interval
     max_wait = 60.0
     disconnect_start_time = None
-    
+    next_stale_check = _now() + STALE_CHECK_INTERVAL
+
     while True:
-        now = time.time()
-        
+        # Clear before inspecting state so a wake-up during this pass is not lost
+        _wake.clear()
+        now = _now()
+
+        if now >= next_stale_check:
+            next_stale_check = now + STALE_CHECK_INTERVAL
+            _check_stale_stream(now)
+
         # Only attempt reconnect if disconnected and wait time has passed
         if not _sio_connected:
-            
+
             # Watchdog tracking
             if disconnect_start_time is None:
                 disconnect_start_time = now
@@ -366,7 +677,7 @@ def _reconnect_loop():
             if (now - _last_connect_attempt) >= current_wait:
                 _sio_initialized = True
                 _last_connect_attempt = now
-                
+
                 if _connect_socketio():
                     # Reset backoff on success
                     current_wait = _reconnect_interval
@@ -374,95 +685,90 @@ def _reconnect_loop():
                 else:
                     # Exponential backoff on failure: 5s -> 10s -> 20s -> 40s -> 60s
                     current_wait = min(current_wait * 2, max_wait)
-                    if _connection_attempt_count % 10 == 0 or _connection_attempt_count < 5:
-                       # Only print occasionally to avoid spam
-                       pass
-            
-            # Shorter sleep to remain responsive to shutdown, but don't spin tight
-            time.sleep(1.0)
         else:
-            # While connected, check periodically but don't do anything
-            # Reset backoff so next failure starts fresh
+            # While connected, reset backoff so next failure starts fresh
             if current_wait > _reconnect_interval:
                 current_wait = _reconnect_interval
             disconnect_start_time = None
-            time.sleep(1.0)
-
-
-def _stale_watchdog_loop():
-    """Force reconnect if we appear connected but no fresh frames arrive for too long."""
-    global _latest_frame, _latest_frame_time, _last_connect_attempt, _sio_connected, _sio_client
-    while True:
-        time.sleep(STALE_CHECK_INTERVAL)
-        now = time.time()
-        age = _frame_age(now)
-        
-        # Don't kill connection if we JUST connected (within STALE_RECONNECT_AGE)
-        # This gives time for the first frame to arrive
-        connection_age = now - _last_connect_attempt
-        if connection_age < STALE_RECONNECT_AGE:
-             continue
-
-        # If we think we are connected but the client says otherwise, or if frames are too old
-        client_connected_status = False
-        if _sio_client is not None:
-            try:
-                client_connected_status = _sio_client.connected
-            except:
-                pass
-
-        needs_reconnect = (_sio_connected and age > STALE_RECONNECT_AGE) or \
-                          (_sio_connected and _sio_client is not None and not client_connected_status)
-        
-        if needs_reconnect:
-            print(f"[CAPTURE] Stale frame ({age:.1f}s), reconnecting...")
-
-            try:
-                _sio_connected = False
-                if _sio_client is not None:
-                    _sio_client.disconnect()
-            except Exception as e:
-                print(f"[CAPTURE] Reconnect error: {e}")
 
-            _sio_client = None
-            _latest_frame = None
-            _latest_frame_time = 0.0
-            # Trigger immediate reconnect attempt
-            _last_connect_attempt = now - _reconnect_interval
+        # Sleep until the next stale check, or the next reconnect attempt if disconnected
+        now = _now()
+        timeout = next_stale_check - now
+        if not _sio_connected:
+            timeout = min(timeout, _last_connect_attempt + current_wait - now)
+        _wake.wait(timeout=max(0.0, timeout))
 
 
 def start_capture_reconnect_daemon(reconnect_interval: float = 5.0):
     """Start background reconnect attempts to keep the video stream alive."""
-    global _reconnect_interval, _reconnector_started, _stale_watchdog_started, _stats_window_start
+    global _reconnect_interval, _reconnector_started, _stats_window_start
     if _reconnector_started:
         return
     _reconnector_started = True
-    _stats_window_start = time.time()
+    _stats_window_start = _now()
     _reconnect_interval = max(1.0, reconnect_interval)
-    threading.Thread(target=_reconnect_loop, daemon=True).start()
-    if not _stale_watchdog_started:
-        _stale_watchdog_started = True
-        threading.Thread(target=_stale_watchdog_loop, daemon=True).start()
+    threading.Thread(target=_stream_supervisor_loop, daemon=True).start()
 
 
-def _get_fresh_frame(timeout: float = FRESH_RETRY_TOTAL, sleep_s: float = FRESH_RETRY_SLEEP):
-    """Attempt to obtain a fresh frame within the timeout window."""
-    global _last_connect_attempt
-    deadline = time.time() + max(0.0, timeout)
+def _get_fresh_frame(
+    timeout: float = FRESH_RETRY_TOTAL, sleep_s: float = FRESH_RETRY_SLEEP, copy: bool = True
+):
+    """Attempt to obtain a fresh frame within the timeout window (see capture_frame for copy).
+
+    Returns (frame, source JPEG or None), or (None, None) on timeout.
+    """
+    deadline = _now() + max(0.0, timeout)
     triggered_reconnect = False
     while True:
-        frame = capture_frame()
+        frame, jpeg = _capture_frame_and_jpeg(copy=copy)
         if frame is not None:
-            return frame
+            return frame, jpeg
         # If disconnected, trigger immediate reconnect attempt (once)
         if not _sio_connected and not triggered_reconnect:
-            _last_connect_attempt = 0.0
+            _request_reconnect()
             triggered_reconnect = True
-        if time.time() >= deadline:
-            return None
+        if _now() >= deadline:
+            return None, None
         time.sleep(max(0.0, sleep_s))
 
 
+def _scale_bbox_scalar(x1, y1, x2, y2, w, h, model_input_size):
+    """Scale one box given as primitive floats; returns (x1, y1, x2, y2, valid).
+
+    Inputs must be finite. Compiled with Numba when it is available; otherwise
+    it is the plain-Python path, so it avoids list scans and nested min/max calls.
+    """
+    mx = x1 if x1 > x2 else x2
+    my = y1 if y1 > y2 else y2
+    max_coord = mx if mx > my else my
+    epsilon = 1e-6
+
+    if 0.0 <= max_coord <= 1.0 + epsilon:
+        x1, x2 = x1 * w, x2 * w
+        y1, y2 = y1 * h, y2 * h
+    elif max_coord <= model_input_size + epsilon:
+        scale = min(model_input_size / w, model_input_size / h)
+        pad_x = (model_input_size - w * scale) / 2.0
+        pad_y = (model_input_size - h * scale) / 2.0
+        x1 = (x1 - pad_x) / scale
+        x2 = (x2 - pad_x) / scale
+        y1 = (y1 - pad_y) / scale
+        y2 = (y2 - pad_y) / scale
+
+    wm1 = w - 1.0
+    hm1 = h - 1.0
+    x1 = 0.0 if x1 < 0.0 else (wm1 if x1 > wm1 else x1)
+    y1 = 0.0 if y1 < 0.0 else (hm1 if y1 > hm1 else y1)
+    x2 = 0.0 if x2 < 0.0 else (wm1 if x2 > wm1 else x2)
+    y2 = 0.0 if y2 < 0.0 else (hm1 if y2 > hm1 else y2)
+    return x1, y1, x2, y2, (x2 > x1 and y2 > y1)
+
+
+_scale_bbox_kernel = (
+    njit(cache=True, fastmath=True)(_scale_bbox_scalar) if njit is not None else _scale_bbox_scalar
+)
+
+
 def scale_bbox_to_frame(
     bbox_xyxy,
     frame_shape: Optional[Tuple[int, int, int]],
@@ -474,6 +780,8 @@ def scale_bbox_to_frame(
     - Normalized [0,1] coordinates
     - Pixel coordinates in the model's square input size (with possible letterboxing)
     - Pixel coordinates already in frame space
+
+    Single boxes go through _scale_bbox_kernel (Numba-compiled when available).
     """
     if not bbox_xyxy or frame_shape is None or len(frame_shape) < 2:
         return None
@@ -483,44 +791,22 @@ def scale_bbox_to_frame(
     except (TypeError, ValueError):
         return None
 
-    if len(coords) != 4 or any(math.isnan(c) or math.isinf(c) for c in coords):
+    if len(coords) != 4:
         return None
 
     h, w = frame_shape[:2]
     if h <= 0 or w <= 0:
         return None
 
-    x1, y1, x2, y2 = coords
-    max_coord = max(coords)
-    epsilon = 1e-6
-
-    # Normalized coordinates [0,1]
-    if 0 <= max_coord <= 1.0 + epsilon:
-        x1, x2 = x1 * w, x2 * w
-        y1, y2 = y1 * h, y2 * h
-    # Model-space coordinates (e.g., 416x416) with possible letterboxing
-    elif max_coord <= model_input_size + epsilon:
-        scale = min(model_input_size / w, model_input_size / h)
-        scaled_w = w * scale
-        scaled_h = h * scale
-        pad_x = (model_input_size - scaled_w) / 2.0
-        pad_y = (model_input_size - scaled_h) / 2.0
-        x1 = (x1 - pad_x) / scale
-        x2 = (x2 - pad_x) / scale
-        y1 = (y1 - pad_y) / scale
-        y2 = (y2 - pad_y) / scale
-    # Else: assume already in frame pixel space
-
-    # Clamp and validate
-    x1 = max(0.0, min(w - 1, x1))
-    y1 = max(0.0, min(h - 1, y1))
-    x2 = max(0.0, min(w - 1, x2))
-    y2 = max(0.0, min(h - 1, y2))
-
-    if x2 <= x1 or y2 <= y1:
+    # The kernel (and fastmath) assume finite inputs, so NaN/inf is rejected up front
+    if any(math.isnan(c) or math.isinf(c) for c in coords):
         return None
 
-    return [x1, y1, x2, y2]
+    x1, y1, x2, y2, ok = _scale_bbox_kernel(
+        coords[0], coords[1], coords[2], coords[3],
+        float(w), float(h), float(model_input_size),
+    )
+    return [x1, y1, x2, y2] if ok else None
 
 
 def get_stream_health():
@@ -536,7 +822,7 @@ def get_stream_health():
     """
     global _frames_received, _stats_window_start, _last_frame_gap, _disconnects_in_window
 
-    now = time.time()
+    now = _now()
     with _stats_lock:
         window = now - _stats_window_start if _stats_window_start > 0 else 0
         fps = _frames_received / window if window > 1 else 0
@@ -563,42 +849,114 @@ def get_stream_health():
 
 def get_stream_status():
     """Return basic stream status without resetting stats."""
-    now = time.time()
+    now = _now()
     frame_age = round(now - _latest_frame_time, 1) if _latest_frame_time > 0 else None
     return {"connected": _sio_connected, "frame_age": frame_age}
 
 
 def get_snapshot_jpeg():
     """Return the current frame as a base64-encoded JPEG, or None if unavailable."""
-    frame = capture_frame()
+    # A fresh frame from the stream is served as its own JPEG: no decode or re-encode
+    with _frame_lock:
+        jpeg = _latest_jpeg if _sio_connected and _frame_age(_now()) <= STALE_FRAME_MAX_AGE else None
+    if jpeg is not None:
+        return base64.b64encode(jpeg).decode('ascii')
+    frame = capture_frame(copy=False)
     if frame is None:
         return None
-    _, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    try:
+        buf = _encode_jpeg(frame, quality=85)
+    except Exception as e:
+        print(f"[CAPTURE] Failed to encode snapshot: {e}")
+        return None
     return base64.b64encode(buf).decode('ascii')
 
 
+def _draw_bbox(frame, x1, y1, x2, y2, color=(0, 255, 0), thickness: int = 1):
+    """Draw a box outline on the frame in place.
+
+    A 1px outline is written as four NumPy edge slices, which skips
+    cv2.rectangle's dispatch. Coordinates must already be clamped to the frame.
+    """
+    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+    if thickness != 1:
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, thickness)
+        return
+    frame[y1, x1:x2 + 1] = color
+    frame[y2, x1:x2 + 1] = color
+    frame[y1:y2 + 1, x1] = color
+    frame[y1:y2 + 1, x2] = color
+
+
+def _render_detection_jpeg(frame, bbox_scaled, save_max_dim):
+    """Downscale, draw the box on and encode a detection frame (runs on the disk writer)."""
+    # Downscale the saved image only; the model never sees more than model_input_size anyway
+    h, w = frame.shape[:2]
+    save_scale = 1.0
+    if save_max_dim and max(h, w) > save_max_dim:
+        save_scale = save_max_dim / max(h, w)
+        frame = cv2.resize(
+            frame,
+            (max(1, int(w * save_scale)), max(1, int(h * save_scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+
+    # Draw bounding box if provided
+    if bbox_scaled:
+        x1, y1, x2, y2 = bbox_scaled
+        if not frame.flags.writeable:
+            frame = frame.copy()
+        if save_scale != 1.0:
+            # int() truncation can land one pixel past the resized edge
+            sw, sh = frame.shape[1] - 1, frame.shape[0] - 1
+            _draw_bbox(
+                frame,
+                min(x1 * save_scale, sw), min(y1 * save_scale, sh),
+                min(x2 * save_scale, sw), min(y2 * save_scale, sh),
+            )
+        else:
+            _draw_bbox(frame, x1, y1, x2, y2)
+
+    return _encode_jpeg(frame, optimize=True)
+
+
 def capture_and_save_detection(
     label: str,
     confidence: float,
     bbox_xyxy=None,
     *,
-    detection_history: List[dict],
+    detection_history: Deque[dict],
     next_detection_id: int,
     timezone,
     frame=None,
     model_input_size: int = MODEL_INPUT_SIZE,
+    save_max_dim: Optional[int] = SAVE_MAX_DIM,
+    on_save_failed: Optional[Callable[[dict], None]] = None,
 ) -> Tuple[Optional[dict], int]:
     """Capture current frame and save as a detection image.
 
     Optionally draws the provided bounding box (x1, y1, x2, y2) on the frame before saving.
+    Frames larger than save_max_dim are downscaled (aspect ratio kept) before drawing and
+    encoding; pass None to save at full resolution. The logged bbox_xyxy stays in
+    stream-frame coordinates. A stream frame that needs neither a box nor a resize is
+    saved as the JPEG bytes it arrived in, skipping the re-encode. Otherwise resizing,
+    drawing and encoding run on the disk writer thread, so a passed-in frame must not
+    be modified after the call. If that render or the write fails, the entry is removed
+    from detection_history again (its log line is never written) and on_save_failed
+    is called with it on the writer thread.
 
     Returns:
         (entry or None, updated_next_detection_id)
     """
-    current_time = time.time()
+    current_time = time.time()  # wall clock: stored as the entry timestamp
 
-    # Capture frame (prefer provided, else try fresh)
-    frame = frame if frame is not None else _get_fresh_frame()
+    # Capture frame (prefer provided, else try fresh). The stream frame is taken
+    # read-only: it is copied below only if it must be drawn on at full size.
+    # Its source JPEG is read for the same frame generation, so it always
+    # matches these pixels.
+    source_jpeg = None
+    if frame is None:
+        frame, source_jpeg = _get_fresh_frame(copy=False)
     if frame is None:
         print("[CAPTURE] No fresh frame available, skipping save")
         return None, next_detection_id
@@ -607,25 +965,23 @@ def capture_and_save_detection(
         bbox_xyxy, frame.shape, model_input_size=model_input_size
     )
 
-    # Generate timestamped filename using local timezone
-    now = datetime.now(timezone)
-    timestamp_str = now.strftime("%Y%m%d_%H%M%S")
+    # Generate timestamped filename using local timezone, from the same clock
+    # reading as the entry timestamp so the two always agree
+    now = datetime.fromtimestamp(current_time, timezone)
+    timestamp_str = (
+        f"{now.year:04d}{now.month:02d}{now.day:02d}_"
+        f"{now.hour:02d}{now.minute:02d}{now.second:02d}"
+    )
     filename = f"detection_{timestamp_str}_{next_detection_id:03d}.jpg"
     filepath = os.path.join(IMAGES_DIR, filename)
 
-    # Draw bounding box if provided
-    if bbox_scaled:
-        x1, y1, x2, y2 = bbox_scaled
-        cv2.rectangle(
-            frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 1
-        )
+    h, w = frame.shape[:2]
+    fits = not save_max_dim or max(h, w) <= save_max_dim
+    jpeg = source_jpeg if not bbox_scaled and fits else None
 
-    # Save image
-    try:
-        cv2.imwrite(filepath, frame)
-    except Exception as e:
-        print(f"[CAPTURE] Failed to save image: {e}")
-        return None, next_detection_id
+    if jpeg is None:
+        # Rendered and encoded by the disk writer; the callback thread only queues it
+        jpeg = functools.partial(_render_detection_jpeg, frame, bbox_scaled, save_max_dim)
 
     # Create log entry
     entry = {
@@ -634,22 +990,41 @@ def capture_and_save_detection(
         "label": label,
         "confidence": confidence,
         "timestamp": current_time,
-        "time_formatted": now.strftime("%d %b %Y, %H:%M:%S").lstrip("0"),
+        # Same as strftime("%d %b %Y, %H:%M:%S").lstrip("0") in the C locale
+        "time_formatted": (
+            f"{now.day} {_MONTHS[now.month - 1]} {now.year}, "
+            f"{now.hour:02d}:{now.minute:02d}:{now.second:02d}"
+        ),
     }
     if bbox_scaled:
+        x1, y1, x2, y2 = bbox_scaled
         entry["bbox_xyxy"] = [int(x1), int(y1), int(x2), int(y2)]
 
-    # Add to history
+    def _forget_entry():
+        try:
+            detection_history.remove(entry)
+        except ValueError:
+            pass  # Already evicted
+        if on_save_failed is not None:
+            on_save_failed(entry)
+
+    # Rotate before appending: the history deque's maxlen would otherwise drop
+    # the oldest entry silently and leave its image on disk (unlinks go to the writer thread)
+    overflow = len(detection_history) + 1 - MAX_DETECTION_IMAGES
+    if overflow > 0:
+        delete_oldest_detections(detection_history, overflow)
+
+    # Added to history before queueing, so a failed write can always find it to remove
     detection_history.append(entry)
-    save_detection_to_log(entry)
+
+    # Image and log line are queued as one item: both land or neither does
+    if not queue_detection_write(filepath, jpeg, entry, on_error=_forget_entry):
+        detection_history.pop()
+        return None, next_detection_id
 
     # Update state
     next_detection_id += 1
 
-    # Rotate if needed
-    while len(detection_history) > MAX_DETECTION_IMAGES:
-        delete_oldest_detection(detection_history)
-
     print(f"✅ Detection saved: {filename} ({label}, {confidence:.2f})")
 
     return entry, next_detection_id
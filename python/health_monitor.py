@@ -1,12 +1,13 @@
 import http.client
-import json
 import os
 import socket
+import subprocess
 import threading
 import time
 
 from mqtt_client import (
-    CLIENT_ID,
+    OFFLINE_PAYLOAD,
+    QOS_STATE,
     STATUS_TOPIC,
     get_client,
     is_connected,
@@ -17,19 +18,25 @@ from mqtt_client import (
 # Software health monitor config
 HEALTH_CHECK_INTERVAL = 30          # seconds between health checks
 REBOOT_GRACE_SECONDS = 5 * 60       # if no progress for this long AND MQTT down, reboot
+MQTT_DOWN_LOG_EVERY = 4             # while MQTT stays down, repeat the status line every N checks
 
 # Video runner container name (used by Arduino App Lab)
 VIDEO_RUNNER_CONTAINER = "detect-objects-on-camera-modified-ei-video-obj-detection-runner-1"
+# Seconds Docker waits after SIGTERM before SIGKILL on restart. The stuck runner
+# rarely exits cleanly, so Docker's 10 s default mostly adds recovery latency.
+CONTAINER_STOP_GRACE = 2
+DOCKER_CLI_TIMEOUT = 15  # seconds before the docker CLI fallback is abandoned
 
 _health_thread_started = False
-last_progress_time = time.time()
-last_mqtt_ok = time.time()
+# Monotonic seconds: a wall-clock (NTP/RTC) step must never look like a stall and force a reboot
+last_progress_time = time.monotonic()
+last_mqtt_ok = last_progress_time
 
 
 def mark_progress(reason: str = ""):
     """Track activity for health decisions."""
     global last_progress_time
-    last_progress_time = time.time()
+    last_progress_time = time.monotonic()
 
 
 class UnixSocketHTTPConnection(http.client.HTTPConnection):
@@ -54,7 +61,7 @@ def _restart_via_unix_socket() -> bool:
 
     try:
         conn = UnixSocketHTTPConnection(socket_path, timeout=30)
-        conn.request("POST", f"/containers/{VIDEO_RUNNER_CONTAINER}/restart?t=10")
+        conn.request("POST", f"/containers/{VIDEO_RUNNER_CONTAINER}/restart?t={CONTAINER_STOP_GRACE}")
         response = conn.getresponse()
         conn.close()
 
@@ -84,7 +91,7 @@ def _restart_via_docker_host_api() -> bool:
     for host, port in docker_hosts:
         try:
             conn = http.client.HTTPConnection(host, port, timeout=10)
-            conn.request("POST", f"/containers/{VIDEO_RUNNER_CONTAINER}/restart?t=10")
+            conn.request("POST", f"/containers/{VIDEO_RUNNER_CONTAINER}/restart?t={CONTAINER_STOP_GRACE}")
             response = conn.getresponse()
             conn.close()
 
@@ -122,14 +129,24 @@ def restart_video_runner_container() -> bool:
         return True
 
     # Method 3: Fall back to CLI (might work if docker is in PATH elsewhere)
+    # Exec'd directly (no /bin/sh hop) and bounded so a hung daemon cannot wedge us
     print("[HEALTH] Trying docker CLI as last resort...")
     try:
-        result = os.system(f"docker restart {VIDEO_RUNNER_CONTAINER}")
-        if result == 0:
+        result = subprocess.run(
+            ["docker", "restart", "-t", str(CONTAINER_STOP_GRACE), VIDEO_RUNNER_CONTAINER],
+            shell=False,
+            timeout=DOCKER_CLI_TIMEOUT,
+            stdout=subprocess.DEVNULL,
+        )
+        if result.returncode == 0:
             print(f"[HEALTH] ✓ Container restarted via docker CLI")
             return True
         else:
-            print(f"[HEALTH] ✗ docker CLI failed with code {result}")
+            print(f"[HEALTH] ✗ docker CLI failed with code {result.returncode}")
+    except FileNotFoundError:
+        print("[HEALTH] ✗ docker CLI not found in PATH")
+    except subprocess.TimeoutExpired:
+        print(f"[HEALTH] ✗ docker CLI timed out after {DOCKER_CLI_TIMEOUT}s")
     except Exception as e:
         print(f"[HEALTH] ✗ docker CLI error: {e}")
 
@@ -144,8 +161,9 @@ def force_reboot(reason: str):
     try:
         safe_publish(
             STATUS_TOPIC,
-            json.dumps({"device": CLIENT_ID, "status": "offline"}),
+            OFFLINE_PAYLOAD,
             retain=True,
+            qos=QOS_STATE,
         )
         get_client().loop_stop()
     except Exception as e:
@@ -159,7 +177,7 @@ def force_reboot(reason: str):
 
     # Trigger reboot; on failure, exit so system supervisor can restart us
     try:
-        os.system("reboot")
+        subprocess.run(["reboot"], shell=False, timeout=DOCKER_CLI_TIMEOUT)
         time.sleep(5)
     finally:
         os._exit(1)
@@ -168,15 +186,23 @@ def force_reboot(reason: str):
 def _health_monitor():
     """Periodic health check: try reconnects, and reboot if stuck offline."""
     global last_mqtt_ok
+    down_checks = 0
     while True:
-        now = time.time()
+        now = time.monotonic()
         stale = now - last_progress_time
 
         # Try to heal MQTT connectivity if lost
         if is_connected():
+            if down_checks:
+                print(f"[HEALTH] MQTT back after {int(now - last_mqtt_ok)}s")
+            down_checks = 0
             last_mqtt_ok = now
         else:
-            print("[HEALTH] MQTT down; attempting reconnect...")
+            # One line when the outage starts, then a periodic reminder; the
+            # reconnect attempts below already log each failure
+            if down_checks % MQTT_DOWN_LOG_EVERY == 0:
+                print(f"[HEALTH] MQTT down for {int(now - last_mqtt_ok)}s; attempting reconnect...")
+            down_checks += 1
             mqtt_connect_with_retry(max_attempts=2, backoff=2)
 
         # If we've been stale for too long and still offline, reboot
@@ -1,38 +1,39 @@
 from arduino.app_utils import App, Bridge  # type: ignore
 from arduino.app_bricks.web_ui import WebUI  # type: ignore
 from arduino.app_bricks.video_objectdetection import VideoObjectDetection  # type: ignore
-from threading import Timer
 
+import collections
 import time
 import json
 import threading
 import signal
 import sys
 import os
+from dataclasses import dataclass
 from datetime import datetime
-import pytz  # type: ignore
+from zoneinfo import ZoneInfo
 
 from mqtt_client import (
     CLIENT_ID,
     MQTT_DETECTION_TOPIC,
+    OFFLINE_PAYLOAD,
+    QOS_FIRE_AND_FORGET,
+    QOS_STATE,
     STATUS_TOPIC,
+    dumps_payload,
     get_client,
     mqtt_connect_with_retry,
     safe_publish,
 )
 from persistence import (
-    DATA_DIR,
-    IMAGES_DIR,
-    LOG_FILE,
     MAX_DETECTION_IMAGES,
-    delete_oldest_detection,
     init_data_directories,
     load_detection_history,
     load_settings,
-    rewrite_log_file,
+    flush_pending_writes,
     flush_settings,
-    save_detection_to_log,
     save_settings,
+    start_disk_writer,
 )
 from capture import (
     capture_and_save_detection,
@@ -59,39 +60,107 @@ from ui_handlers import (
 )
 
 # Timezone configuration - change this to your timezone
-LOCAL_TIMEZONE = pytz.timezone('America/Montreal')
+LOCAL_TIMEZONE = ZoneInfo('America/Montreal')
 
 # Initialize MQTT connection
 mqtt_connect_with_retry()
 
+# ================= CONSOLE LOG =================
+# Hot-path threads append lines here; a daemon thread writes them to stdout so a slow
+# pipe/journald never blocks the detection callback. Past capacity the oldest lines drop.
+LOG_BUFFER_LINES = 1024
+_log_q = collections.deque(maxlen=LOG_BUFFER_LINES)
+_log_wake = threading.Event()
+_log_write_lock = threading.Lock()  # Keeps the drainer and shutdown flush from interleaving
+
+
+def log(msg):
+    """Queue a console line for the log writer thread (non-blocking)."""
+    _log_q.append(msg)
+    _log_wake.set()
+
+
+def flush_log():
+    """Write all queued console lines with a single stdout write and flush."""
+    with _log_write_lock:
+        lines = []
+        try:
+            while True:
+                lines.append(_log_q.popleft())
+        except IndexError:
+            pass
+        if lines:
+            lines.append("")
+            sys.stdout.write("\n".join(lines))
+            sys.stdout.flush()
+
+
+def log_writer_loop():
+    while True:
+        _log_wake.wait()
+        _log_wake.clear()
+        flush_log()
+
+
+threading.Thread(target=log_writer_loop, daemon=True).start()
+
 # ================= HEARTBEAT THREAD =================
 
+HEARTBEAT_INTERVAL = 60  # Seconds between heartbeat ticks when nothing wakes the thread
+HEARTBEAT_KEEPALIVE = 300  # Seconds between heartbeats even when nothing changed
+_hb_wake = threading.Event()  # Set by on_detections on an idle -> active transition
+# Same bytes json.dumps() produced for the status dict; CLIENT_ID is escaped once here
+HEARTBEAT_TMPL = (
+    '{"device": ' + json.dumps(CLIENT_ID) + ', "status": "%s", "timestamp": %d, '
+    '"last_detection_ts": %s, "last_detection_age": %s}'
+)
+
+
 def heartbeat():
+    last_status = None
+    last_publish = 0.0
     while True:
-        current_time = time.time()
-        detection_age = (current_time - last_detection_time) if last_detection_time > 0 else None
+        # Cleared before reading state so a transition during this tick wakes the next wait
+        _hb_wake.clear()
+        # Ages use the monotonic clock (immune to NTP steps); epoch time is only for the payload
+        now_mono = time.monotonic()
+        detection_age = (now_mono - _last_detection_mono) if _last_detection_mono is not None else None
+        age_int = int(detection_age) if detection_age is not None else None
+        # active = recent detection; idle = no detection recently
         status = "active" if detection_age is not None and detection_age <= WATCHDOG_THRESHOLD else "idle"
 
-        timestamp_str = datetime.now(LOCAL_TIMEZONE).strftime("%d %b %Y, %H:%M:%S")
-
-        safe_publish(
-            STATUS_TOPIC,
-            json.dumps({
-                "device": CLIENT_ID,
-                "status": status,  # active = recent detection; idle = no detection recently
-                "timestamp": int(current_time),
-                "last_detection_ts": int(last_detection_time) if last_detection_time > 0 else None,
-                "last_detection_age": int(detection_age) if detection_age is not None else None,
-            }),
-            retain=True
-        )
-        age_str = f"{int(detection_age)}s" if detection_age is not None else "never"
-        stream = get_stream_status()
-        stream_str = f"frame_age={stream['frame_age']}s" if stream["frame_age"] is not None else "no_frames"
-        stream_str = f"{stream_str} stream={'connected' if stream['connected'] else 'disconnected'}"
-        print(f"{timestamp_str} [HEARTBEAT] status={status} last_detection_age={age_str} {stream_str}")
+        # Publish (and log) only when status changes, or as a keepalive. The age
+        # moves every tick, so it is reported but not compared.
+        if status != last_status or now_mono - last_publish >= HEARTBEAT_KEEPALIVE:
+            # A status change must land (the retained value stays until the next
+            # publish); an unchanged keepalive may be lost
+            qos = QOS_STATE if status != last_status else QOS_FIRE_AND_FORGET
+            last_status = status
+            last_publish = now_mono
+            safe_publish(
+                STATUS_TOPIC,
+                HEARTBEAT_TMPL % (
+                    status,
+                    int(time.time()),
+                    int(last_detection_time) if last_detection_time > 0 else "null",
+                    age_int if age_int is not None else "null",
+                ),
+                retain=True,
+                qos=qos,
+            )
+            timestamp_str = datetime.now(LOCAL_TIMEZONE).strftime("%d %b %Y, %H:%M:%S")
+            age_str = f"{age_int}s" if age_int is not None else "never"
+            stream = get_stream_status()
+            stream_str = f"frame_age={stream['frame_age']}s" if stream["frame_age"] is not None else "no_frames"
+            stream_str = f"{stream_str} stream={'connected' if stream['connected'] else 'disconnected'}"
+            log(f"{timestamp_str} [HEARTBEAT] status={status} last_detection_age={age_str} {stream_str}")
         mark_progress("heartbeat")
-        time.sleep(60)
+
+        wait_s = HEARTBEAT_INTERVAL
+        if status == "active":
+            # Tick right after the active -> idle boundary instead of up to a minute later
+            wait_s = min(wait_s, WATCHDOG_THRESHOLD - detection_age + 0.5)
+        _hb_wake.wait(timeout=max(1.0, wait_s))
 
 # Configuration
 DEBOUNCE_SECONDS = 60
@@ -100,19 +169,49 @@ _DEFAULT_LABEL = "bottle"
 
 # Initialize data directories and load persisted settings
 init_data_directories()
+start_disk_writer()
 
 _saved = load_settings({
     "confidence": _DEFAULT_CONFIDENCE,
     "label": _DEFAULT_LABEL,
 })
-DETECTION_CONFIDENCE = float(_saved["confidence"])
-DETECTION_LABEL = str(_saved["label"])
 
-detected_labels = {DETECTION_LABEL.lower()}
+
+@dataclass
+class DetectionConfig:
+    """Runtime-tunable detection settings, mutated in place by the UI override handlers.
+
+    label_lc is the lowercased label used for hot-path matching; set_label keeps it in sync.
+    """
+    __slots__ = ("confidence", "label", "label_lc")
+    confidence: float
+    label: str
+    label_lc: str
+
+    def set_label(self, label: str):
+        self.label = label
+        self.label_lc = label.lower()
+
+
+cfg = DetectionConfig(
+    float(_saved["confidence"]), str(_saved["label"]), str(_saved["label"]).lower()
+)
+
+detected_labels = {cfg.label_lc}
 labels_emitted_once = False
+# New labels only mark the set dirty; labels_emit_loop sends at most one update per interval
+_labels_lock = threading.Lock()  # Guards detected_labels adds against snapshots on other threads
+_labels_dirty = False
+_labels_sorted = None  # sorted(detected_labels), rebuilt only after a new label is added
+LABELS_EMIT_INTERVAL = 1.0  # seconds
+
+# Hot-path label matching: raw detection keys map to their canonical form
+# through a small cache (the target itself is cfg.label_lc)
+_label_key_cache = {}
+_LABEL_KEY_CACHE_MAX = 256  # the model's label set is far smaller; this only bounds odd input
 
 # Detection history state
-detection_history = []
+detection_history = collections.deque(maxlen=MAX_DETECTION_IMAGES)
 next_detection_id = 1
 
 # Load detection history
@@ -120,13 +219,18 @@ detection_history, next_detection_id = load_detection_history()
 
 # Components
 ui = WebUI()
-detection_stream = VideoObjectDetection(confidence=DETECTION_CONFIDENCE, debounce_sec=0.0)
+detection_stream = VideoObjectDetection(confidence=cfg.confidence, debounce_sec=0.0)
 bridge = Bridge()
 
 # State
 led_on = False
-last_detection_time = 0.0
-timeout_timer = None
+last_detection_time = 0.0  # Epoch seconds, reported as last_detection_ts
+_last_detection_mono = None  # time.monotonic() of the last detection, for age math
+# LED auto-off: one long-lived thread sleeps until this monotonic deadline
+# (0.0 = nothing pending); detections just push it forward
+_led_off_deadline = 0.0
+_led_lock = threading.Lock()   # Guards _led_off_deadline against the LED-off thread
+_led_wake = threading.Event()  # Wakes the LED-off thread when a deadline is armed
 WATCHDOG_THRESHOLD = 90  # Seconds since last detection to consider the system idle
 
 # Start heartbeat after state is initialized to avoid NameError in thread
@@ -159,141 +263,241 @@ def set_led(state: bool):
     try:
         bridge.call("setLedState", state)
         led_on = state
-        print(f"LED {'ON' if state else 'OFF'}")
+        log(f"LED {'ON' if state else 'OFF'}")
     except Exception as e:
-        print(f"Bridge error: {e}")
+        log(f"Bridge error: {e}")
 
-def playAnimation():
-    """Play the animation via bridge with error handling."""
+def signal_detection():
+    """Turn the LED on and start the animation with one bridge call."""
+    global led_on
     try:
-        bridge.call("playAnimation")
+        bridge.call("detectionEvent")
+        led_on = True
+        log("LED ON (animation started)")
     except Exception as e:
-        print(f"Bridge error: {e}")
+        log(f"Bridge error: {e}")
 
 
-def turn_off_led():
-    """Timer callback to turn off LED after timeout."""
-    if led_on:
-        set_led(False)
+def led_timeout_loop():
+    """Turn the LED off once DEBOUNCE_SECONDS pass without a detection."""
+    global _led_off_deadline
+    while True:
+        # Clear before reading the deadline so an arm during this pass is not lost
+        _led_wake.clear()
+        turn_off = False
+        with _led_lock:
+            remaining = None
+            if _led_off_deadline:
+                remaining = _led_off_deadline - time.monotonic()
+                if remaining <= 0:
+                    _led_off_deadline = 0.0
+                    remaining = None
+                    turn_off = True
+        # The Bridge RPC runs outside the lock so schedule_led_timeout() never waits on it
+        if turn_off and led_on:
+            set_led(False)
+        _led_wake.wait(timeout=remaining)
 
 
 def schedule_led_timeout():
-    """Schedule LED to turn off after DEBOUNCE_SECONDS."""
-    global timeout_timer
-    if timeout_timer:
-        timeout_timer.cancel()
-    timeout_timer = Timer(DEBOUNCE_SECONDS, turn_off_led)
-    timeout_timer.daemon = True
-    timeout_timer.start()
+    """Schedule LED to turn off after DEBOUNCE_SECONDS (extends a pending timeout)."""
+    global _led_off_deadline
+    with _led_lock:
+        was_idle = not _led_off_deadline
+        _led_off_deadline = time.monotonic() + DEBOUNCE_SECONDS
+    # A pending wait re-reads the later deadline when it expires, so only an idle thread needs waking
+    if was_idle:
+        _led_wake.set()
+
+
+threading.Thread(target=led_timeout_loop, daemon=True).start()
+
+
+def _normalize_detection_value(val):
+    """Return (confidence, bbox_xyxy) for mixed payload shapes."""
+    # New firmware sends a list of dicts — unwrap the first element
+    if isinstance(val, list) and val and isinstance(val[0], dict):
+        val = val[0]
+    if isinstance(val, dict):
+        return float(val.get("confidence", val.get("score", 0.0))), val.get("bounding_box_xyxy") or val.get("bbox") or ()
+    if isinstance(val, (int, float)):
+        return float(val), ()
+    return 0.0, ()
+
+
+def _canonical_label(key):
+    """Return the stripped, lowercased form of a raw detection key (cached)."""
+    canonical_label = _label_key_cache.get(key)
+    if canonical_label is None:
+        canonical_label = key.strip().lower()
+        if len(_label_key_cache) < _LABEL_KEY_CACHE_MAX:
+            _label_key_cache[key] = canonical_label
+    return canonical_label
 
 
 def on_detections(detections: dict):
     """Handle detections: print all objects, turn LED on for bottles, extend timeout on each detection."""
-    global last_detection_time, next_detection_id
-    current_time = time.time()
+    global last_detection_time, _last_detection_mono, next_detection_id
 
     det = None
 
-    def normalize_detection_value(val):
-        """Return (confidence, bbox_xyxy) for mixed payload shapes."""
-        # New firmware sends a list of dicts — unwrap the first element
-        if isinstance(val, list) and val and isinstance(val[0], dict):
-            val = val[0]
-        if isinstance(val, dict):
-            confidence_val = val.get("confidence", val.get("score", 0.0))
-            bbox_xyxy = val.get("bounding_box_xyxy") or val.get("bbox") or []
-        elif isinstance(val, (int, float)):
-            confidence_val = float(val)
-            bbox_xyxy = []
-        else:
-            confidence_val = 0.0
-            bbox_xyxy = []
-        return float(confidence_val), bbox_xyxy
-
-    # Look for the label in any casing (e.g., bottle, Bottle, BOTTLE)
-    global labels_emitted_once
-    previous_len = len(detected_labels)
+    global labels_emitted_once, _labels_dirty, _labels_sorted
     try:
-        for key, value in detections.items():
-            confidence_val, bbox_xyxy = normalize_detection_value(value)
-
-            canonical_label = key.strip().lower()
-            if canonical_label:
-                detected_labels.add(canonical_label)
-
-            # Keep the first match for the selected detection label
-            # Only accept detections that meet the confidence threshold
-            if det is None and canonical_label == DETECTION_LABEL.lower() and confidence_val >= DETECTION_CONFIDENCE:
+        # Producers keep label casing stable, so try the exact key first;
+        # otherwise look for the label in any casing (e.g., bottle, Bottle, BOTTLE)
+        value = detections.get(cfg.label)
+        if value is None:
+            target_label = cfg.label_lc
+            for key, candidate in detections.items():
+                if _canonical_label(key) == target_label:
+                    value = candidate
+                    break
+
+        # Only accept detections that meet the confidence threshold
+        if value is not None:
+            confidence_val, bbox_xyxy = _normalize_detection_value(value)
+            if confidence_val >= cfg.confidence:
                 det = {
                     "confidence": confidence_val,
                     "bounding_box_xyxy": bbox_xyxy
                 }
+
+        # Collect every label seen for the UI dropdown; a known key is a cached
+        # lookup plus a set probe, so this stays cheap on every frame
+        for key in detections:
+            canonical_label = _canonical_label(key)
+            if canonical_label and canonical_label not in detected_labels:
+                with _labels_lock:
+                    detected_labels.add(canonical_label)
+                    _labels_sorted = None
+                _labels_dirty = True
     except Exception as e:
-        print(f"[DETECTION] Error parsing detections: {e}")
+        log(f"[DETECTION] Error parsing detections: {e}")
 
-    if len(detected_labels) != previous_len or not labels_emitted_once:
-        emit_detected_labels(ui, detected_labels, DETECTION_LABEL)
+    if not labels_emitted_once:
+        _labels_dirty = True
         labels_emitted_once = True
 
-    if det:
-        last_detection_time = current_time
-        confidence = det.get("confidence", 0)
-        mark_progress("detection")
-        bbox_xyxy = det.get("bounding_box_xyxy", [])
-
-        # Turn LED on if not already on
-        if not led_on:
-            set_led(True)
-
-            # Use raw bbox for MQTT (no frame needed)
-            if bbox_xyxy and len(bbox_xyxy) == 4:
-                x1, y1, x2, y2 = bbox_xyxy
-                bbox = {
-                    "x": int(x1),
-                    "y": int(y1),
-                    "w": int(x2 - x1),
-                    "h": int(y2 - y1),
-                }
-            else:
-                bbox = {"x": 0, "y": 0, "w": 0, "h": 0}
-
-            mqtt_payload = {
-                "label": DETECTION_LABEL,
-                "confidence": confidence,
-                "bbox": bbox
-            }
-
-            if safe_publish(MQTT_DETECTION_TOPIC, json.dumps(mqtt_payload)):
-                print(f"✅ MQTT message published to {MQTT_DETECTION_TOPIC}: {DETECTION_LABEL} detected (confidence: {confidence:.2f})")
-            else:
-                print(f"[MQTT] Failed to publish detection for {DETECTION_LABEL}")
-
-            # Capture frame after MQTT — gives reconnect time to complete if stream was stale
-            entry, next_detection_id = capture_and_save_detection(
-                DETECTION_LABEL,
-                confidence,
-                bbox_xyxy,
-                detection_history=detection_history,
-                next_detection_id=next_detection_id,
-                timezone=LOCAL_TIMEZONE,
-            )
-            if entry:
-                emit_detection_saved(ui, detection_history, entry)
+    if not det:
+        return
 
-            playAnimation()
+    # idle -> active: let the heartbeat publish the new status now. The wake comes
+    # after the timestamps are updated, so a woken heartbeat already reads "active".
+    now_mono = time.monotonic()
+    was_idle = _last_detection_mono is None or now_mono - _last_detection_mono > WATCHDOG_THRESHOLD
+    _last_detection_mono = now_mono
+    last_detection_time = time.time()
+    if was_idle:
+        _hb_wake.set()
+    mark_progress("detection")
 
-        # Reset timeout timer – extends delay on each detection
+    # Repeat sighting while the LED is on: only extend the timeout (steady state)
+    if led_on:
         schedule_led_timeout()
-
+        return
+
+    confidence = det.get("confidence", 0)
+    bbox_xyxy = det.get("bounding_box_xyxy", [])
+
+    # Turn LED on and start the animation (one bridge round trip)
+    signal_detection()
+
+    # Use raw bbox for MQTT (no frame needed)
+    if bbox_xyxy and len(bbox_xyxy) == 4:
+        x1, y1, x2, y2 = bbox_xyxy
+        bbox = {
+            "x": int(x1),
+            "y": int(y1),
+            "w": int(x2 - x1),
+            "h": int(y2 - y1),
+        }
+    else:
+        bbox = {"x": 0, "y": 0, "w": 0, "h": 0}
+
+    mqtt_payload = {
+        "label": cfg.label,
+        "confidence": confidence,
+        "bbox": bbox
+    }
+
+    if safe_publish(MQTT_DETECTION_TOPIC, dumps_payload(mqtt_payload), qos=QOS_FIRE_AND_FORGET):
+        log(f"✅ MQTT message published to {MQTT_DETECTION_TOPIC}: {cfg.label} detected (confidence: {confidence:.2f})")
+    else:
+        log(f"[MQTT] Failed to publish detection for {cfg.label}")
+
+    # Capture frame after MQTT — gives reconnect time to complete if stream was stale
+    entry, next_detection_id = capture_and_save_detection(
+        cfg.label,
+        confidence,
+        bbox_xyxy,
+        detection_history=detection_history,
+        next_detection_id=next_detection_id,
+        timezone=LOCAL_TIMEZONE,
+        # The UI already showed the entry; resend the history without it
+        on_save_failed=lambda _entry: _request_history_emit(),
+    )
+    if entry:
+        emit_detection_saved(ui, detection_history, entry)
+
+    # Start the LED timeout; later detections extend it
+    schedule_led_timeout()
 
 detection_stream.on_detect_all(on_detections)
+def _emit_labels():
+    """Send a consistent snapshot of the detected labels to the UI."""
+    global _labels_sorted
+    with _labels_lock:
+        if _labels_sorted is None:
+            _labels_sorted = sorted(detected_labels)
+        labels = _labels_sorted
+    emit_detected_labels(ui, labels, cfg.label)
+
+
+def labels_emit_loop():
+    """Flush label-set changes from on_detections to the UI at most once per interval."""
+    global _labels_dirty
+    while True:
+        time.sleep(LABELS_EMIT_INTERVAL)
+        if _labels_dirty:
+            # Cleared before the snapshot so a label added meanwhile is sent next tick
+            _labels_dirty = False
+            _emit_labels()
+
+
+threading.Thread(target=labels_emit_loop, daemon=True).start()
+
+# history_list is a broadcast, so a burst of request_history (several tabs, a
+# reconnect storm) is answered by one emit at the end of a short window
+HISTORY_EMIT_DEBOUNCE = 0.05  # seconds
+_history_emit_lock = threading.Lock()
+_history_emit_timer = None
+
+
+def _flush_history_emit():
+    global _history_emit_timer
+    with _history_emit_lock:
+        _history_emit_timer = None
+    emit_history_list(ui, detection_history)
+
+
+def _request_history_emit():
+    """Schedule a history_list broadcast, joining one already pending."""
+    global _history_emit_timer
+    with _history_emit_lock:
+        # Not rescheduled on later requests, so a steady stream cannot starve the emit
+        if _history_emit_timer is None:
+            _history_emit_timer = threading.Timer(HISTORY_EMIT_DEBOUNCE, _flush_history_emit)
+            _history_emit_timer.daemon = True
+            _history_emit_timer.start()
+
+
 def _set_confidence(v):
-    globals()["DETECTION_CONFIDENCE"] = v
-    save_settings({"confidence": v, "label": DETECTION_LABEL})
+    cfg.confidence = v
+    save_settings({"confidence": v, "label": cfg.label})
 
 def _set_label(v):
-    globals()["DETECTION_LABEL"] = v
-    save_settings({"confidence": DETECTION_CONFIDENCE, "label": v})
+    cfg.set_label(v)
+    save_settings({"confidence": cfg.confidence, "label": v})
 
 ui.on_message(
     "override_th",
@@ -311,27 +515,25 @@ ui.on_message(
         _set_label,
         sid,
         val,
-        lambda: emit_detected_labels(ui, detected_labels, DETECTION_LABEL),
+        _emit_labels,
     ),
 )
 ui.on_message(
     "request_labels",
     lambda sid, val: handle_labels_request(
-        lambda: emit_detected_labels(ui, detected_labels, DETECTION_LABEL),
+        _emit_labels,
         sid,
         val,
     ),
 )
 ui.on_message(
     "request_history",
-    lambda sid, val: handle_history_request(
-        lambda: emit_history_list(ui, detection_history), sid, val
-    ),
+    lambda sid, val: handle_history_request(_request_history_emit, sid, val),
 )
 ui.on_message(
     "request_threshold",
     lambda sid, val: handle_threshold_request(
-        lambda: emit_threshold(ui, DETECTION_CONFIDENCE), sid, val
+        lambda: emit_threshold(ui, cfg.confidence), sid, val
     ),
 )
 ui.on_message(
@@ -348,35 +550,53 @@ ui.on_message(
     "request_snapshot",
     lambda sid, val: handle_snapshot_request(ui, get_snapshot_jpeg, sid, val),
 )
-emit_detected_labels(ui, detected_labels, DETECTION_LABEL)
+_emit_labels()
 
 # ================= GRACEFUL SHUTDOWN SECTION =================
 
+SHUTDOWN_DEADLINE = 3  # Seconds before a stuck cleanup is abandoned and the process exits anyway
+SHUTDOWN_PUBLISH_TIMEOUT = 0.5  # Seconds to wait for the offline status to be acknowledged
+
+
+def _shutdown_deadline_handler(signum, frame):
+    """SIGALRM fallback: exit cleanly (code 0, so the supervisor stops) if cleanup hangs."""
+    print(f"[SHUTDOWN] Cleanup exceeded {SHUTDOWN_DEADLINE}s, forcing exit")
+    os._exit(0)
+
+
 def shutdown_handler(signum, frame):
     """Handle shutdown signals to ensure clean exit."""
+    signal.signal(signal.SIGALRM, _shutdown_deadline_handler)
+    signal.alarm(SHUTDOWN_DEADLINE)
+    flush_log()
     print("\n🛑 Shutdown signal received. Cleaning up...")
 
-    # Flush any pending settings to disk before exit
+    # Flush any pending settings and queued images to disk before exit
     flush_settings()
+    flush_pending_writes(timeout=SHUTDOWN_DEADLINE - 1)
 
     # Turn off LED
     if led_on:
         set_led(False)
 
-    # Publish offline status
+    # Publish offline status; a dead network only costs the bounded wait, not a TCP timeout
     try:
-        safe_publish(
-            STATUS_TOPIC,
-            json.dumps({"device": CLIENT_ID, "status": "offline"}),
-            retain=True
-        )
         client = get_client()
+        info = client.publish(STATUS_TOPIC, OFFLINE_PAYLOAD, qos=QOS_STATE, retain=True)
+        try:
+            info.wait_for_publish(timeout=SHUTDOWN_PUBLISH_TIMEOUT)
+        except Exception:
+            pass
         client.disconnect()
         client.loop_stop()
-        print("✅ MQTT disconnected and offline status sent.")
+        if info.is_published():
+            print("✅ MQTT disconnected and offline status sent.")
+        else:
+            print("[MQTT] Disconnected before the offline status was acknowledged.")
     except Exception as e:
         print(f"Error during MQTT shutdown: {e}")
 
+    flush_log()
     sys.exit(0)
 
 # Register signal handlers
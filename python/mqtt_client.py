@@ -1,15 +1,28 @@
 import json
 import time
-from typing import Optional
+from typing import Optional, Union
 
 import paho.mqtt.client as mqtt  # type: ignore
 
+# orjson is optional: C serializer that returns bytes, which paho publishes as-is
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
 from mqtt_secrets import SERVERMQTT, SERVERPORT, USERNAME, KEY, CLIENT_ID
 
 # MQTT topics
 STATUS_TOPIC = "unoq/status"
 MQTT_DETECTION_TOPIC = "unoq/detection"
 
+# QoS tradeoff: detections and unchanged heartbeat keepalives are fire-and-forget
+# (QoS 0, no PUBACK round trip; a lost keepalive only repeats the retained value).
+# State changes (offline/online, idle/active) use QoS 1 since they are rare and
+# the retained value must land.
+QOS_FIRE_AND_FORGET = 0
+QOS_STATE = 1
+
 # Internal state
 _connected = False
 _client: Optional[mqtt.Client] = None
@@ -25,7 +38,8 @@ def _ensure_client() -> mqtt.Client:
         _client.reconnect_delay_set(min_delay=2, max_delay=30)
         _client.will_set(
             STATUS_TOPIC,
-            json.dumps({"device": CLIENT_ID, "status": "offline"}),
+            OFFLINE_PAYLOAD,
+            qos=QOS_STATE,
             retain=True,
         )
         _client.on_connect = _on_connect
@@ -49,23 +63,38 @@ def _on_connect(_client, _userdata, _flags, rc):
         # Re-announce online status on (re)connect
         safe_publish(
             STATUS_TOPIC,
-            json.dumps({"device": CLIENT_ID, "status": "online"}),
+            ONLINE_PAYLOAD,
             retain=True,
+            qos=QOS_STATE,
         )
     else:
         _connected = False
         print(f"[MQTT] connection refused (rc={rc})")
 
 
+def dumps_payload(obj) -> Union[bytes, str]:
+    """Serialize an MQTT JSON payload (bytes with orjson, str with the stdlib fallback)."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj)
+
+
+# Status payloads are constant per process: serialize them once at import
+ONLINE_PAYLOAD = dumps_payload({"device": CLIENT_ID, "status": "online"})
+OFFLINE_PAYLOAD = dumps_payload({"device": CLIENT_ID, "status": "offline"})
+
+
 def is_connected() -> bool:
     return _connected
 
 
-def safe_publish(topic: str, payload: str, retain: bool = False) -> bool:
+def safe_publish(
+    topic: str, payload: Union[bytes, str], retain: bool = False, qos: int = QOS_FIRE_AND_FORGET
+) -> bool:
     """Publish with error handling to avoid crashing the main loop."""
     client = _ensure_client()
     try:
-        info = client.publish(topic, payload, retain=retain)
+        info = client.publish(topic, payload, qos=qos, retain=retain)
         rc = getattr(info, "rc", None)
         if rc is None and isinstance(info, tuple):
             rc = info[0]
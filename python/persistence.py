@@ -1,13 +1,25 @@
 import json
 import os
+from collections import deque
+import queue
 import tempfile
 import threading
-from typing import List, Tuple
+import time
+from typing import Callable, Deque, Iterable, List, Optional, Tuple
+
+# orjson is optional: parses the whole log in one C call (stdlib json fallback)
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
 
 MAX_DETECTION_IMAGES = 40  # Maximum number of saved detection images
 DATA_DIR = "data"
 IMAGES_DIR = os.path.join("assets", "images")  # Save to assets so WebUI can serve them
 LOG_FILE = os.path.join(DATA_DIR, "imageslist.log")
+# Previous log segment: once LOG_FILE holds MAX_DETECTION_IMAGES lines it is
+# renamed here and a fresh LOG_FILE is started, so evictions never rewrite the log
+LOG_FILE_PREV = LOG_FILE + ".1"
 SETTINGS_FILE = os.path.join(DATA_DIR, "settings.json")
 
 
@@ -18,42 +30,76 @@ def init_data_directories():
     print(f"✅ Data directories initialized: {DATA_DIR}, {IMAGES_DIR}")
 
 
-def load_detection_history() -> Tuple[List[dict], int]:
-    """Load existing detection history from log file on startup.
+def _parse_log_lines(lines: List[bytes]) -> List[dict]:
+    """Parse JSON log lines, skipping any that are corrupt.
+
+    The lines are parsed as one JSON array (orjson when installed, else the
+    stdlib's C decoder); a torn or corrupt line makes that fail, and only
+    then are lines parsed one by one.
+    """
+    loads = orjson.loads if orjson is not None else json.loads
+    if lines:
+        try:
+            entries = loads(b"[" + b",".join(lines) + b"]")
+            # A line holding several values would shift the count; re-check per line then
+            if len(entries) == len(lines):
+                return entries
+        except ValueError:  # orjson.JSONDecodeError and json.JSONDecodeError both subclass it
+            pass
+    entries = []
+    for line in lines:
+        try:
+            entries.append(loads(line))
+        except ValueError:
+            continue
+    return entries
+
+
+def load_detection_history() -> Tuple[Deque[dict], int]:
+    """Load existing detection history from the log segments on startup.
+
+    The history is a deque bounded to MAX_DETECTION_IMAGES: eviction pops
+    from the left in O(1), and the bound caps it even if a caller forgets
+    to evict (callers evict explicitly so the image is deleted too).
 
     Returns:
-        (history_list, next_id)
+        (history_deque, next_id)
     """
-    detection_history: List[dict] = []
+    detection_history: Deque[dict] = deque(maxlen=MAX_DETECTION_IMAGES)
     next_detection_id = 1
 
-    if not os.path.exists(LOG_FILE):
+    segments = [p for p in (LOG_FILE_PREV, LOG_FILE) if os.path.exists(p)]
+    if not segments:
         print("[HISTORY] No existing log file found, starting fresh")
         return detection_history, next_detection_id
 
     try:
-        with open(LOG_FILE, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if line:
-                    try:
-                        entry = json.loads(line)
-                        detection_history.append(entry)
-                    except json.JSONDecodeError:
-                        continue
-
-        # Trim history to configured maximum to avoid unbounded growth
-        if len(detection_history) > MAX_DETECTION_IMAGES:
-            trimmed = detection_history[-MAX_DETECTION_IMAGES:]
-            removed = len(detection_history) - len(trimmed)
-            detection_history = trimmed
-            print(f"[HISTORY] Trimmed {removed} old records to respect MAX_DETECTION_IMAGES={MAX_DETECTION_IMAGES}")
+        # Oldest segment first, so the newest entries end up at the tail
+        lines: List[bytes] = []
+        for segment in segments:
+            with open(segment, "rb") as f:
+                lines.extend(line for line in (raw.strip() for raw in f.read().splitlines()) if line)
+        entries = _parse_log_lines(lines)
+
+        # The segments hold every live entry plus already-evicted ones; only
+        # the newest MAX_DETECTION_IMAGES are live (older images were deleted),
+        # and the deque's maxlen keeps exactly those
+        total = len(entries)
+        detection_history.extend(entries)
+        if total > 2 * MAX_DETECTION_IMAGES:
+            # Only a log from before segment rotation can grow this far; compact it once
+            print(f"[HISTORY] Trimmed {total - len(detection_history)} old records to respect MAX_DETECTION_IMAGES={MAX_DETECTION_IMAGES}")
             rewrite_log_file(detection_history)
 
         if detection_history:
-            # Set next ID based on highest existing ID (after trimming)
-            max_id = max(entry.get("id", 0) for entry in detection_history)
-            next_detection_id = max_id + 1
+            # IDs are assigned in increasing order and the log is append-ordered,
+            # so the newest entry carries the highest ID
+            next_detection_id = detection_history[-1].get("id", 0) + 1
+            # Load-time order check: a hand-edited log need not end with the highest
+            # ID, and a reused ID would collide with a live entry
+            if any(entry.get("id", 0) >= next_detection_id for entry in detection_history):
+                print("[HISTORY] Log IDs out of order, continuing after the highest one")
+                next_detection_id = max(entry.get("id", 0) for entry in detection_history) + 1
 
         print(f"✅ Loaded {len(detection_history)} detection records from history")
     except Exception as e:
@@ -62,25 +108,80 @@ def load_detection_history() -> Tuple[List[dict], int]:
     return detection_history, next_detection_id
 
 
+def _dumps_log_line(entry: dict) -> bytes:
+    """Serialize one log entry as a UTF-8 JSON line (orjson when installed)."""
+    if orjson is not None:
+        return orjson.dumps(entry) + b"\n"
+    return json.dumps(entry).encode("utf-8") + b"\n"
+
+
+def _write_log_lines(lines: List[bytes], mode: str):
+    """Write serialized log lines in one call and fsync them."""
+    with open(LOG_FILE, mode) as f:
+        f.write(b"".join(lines))
+        f.flush()
+        os.fsync(f.fileno())
+
+
 def save_detection_to_log(entry: dict):
-    """Append a detection entry to the log file."""
+    """Append a detection entry to the log file.
+
+    Once the disk writer runs, the line is queued and fsynced in batches
+    (see LOG_FLUSH_BATCH / LOG_FLUSH_INTERVAL), so a crash can lose at most
+    the last LOG_FLUSH_BATCH entries or LOG_FLUSH_INTERVAL seconds of them.
+    """
     try:
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(json.dumps(entry) + "\n")
+        line = _dumps_log_line(entry)
+        if _queue_disk_op("log", LOG_FILE, line):
+            return
+        _write_log_lines([line], "ab")
     except Exception as e:
         print(f"[HISTORY] Error saving to log: {e}")
 
 
-def rewrite_log_file(detection_history: List[dict]):
-    """Rewrite the entire log file from detection_history (used after rotation)."""
+def rewrite_log_file(detection_history: Iterable[dict]):
+    """Replace both log segments with exactly detection_history.
+
+    Rotation no longer needs this (see LOG_FILE_PREV); load_detection_history
+    uses it only to compact a log written before segment rotation existed.
+
+    The snapshot is serialized on the caller thread; queued appends it already
+    contains are dropped by the writer instead of being written twice.
+    """
+    lines = [_dumps_log_line(entry) for entry in detection_history]
+    if _queue_disk_op("rewrite", LOG_FILE, lines):
+        return
     try:
-        with open(LOG_FILE, "w", encoding="utf-8") as f:
-            for entry in detection_history:
-                f.write(json.dumps(entry) + "\n")
+        _replace_log_file(lines)
     except Exception as e:
         print(f"[HISTORY] Error rewriting log file: {e}")
 
 
+def _replace_log_file(lines: List[bytes]):
+    """Atomically replace the log with lines and drop the previous segment.
+
+    The new content is written and fsynced under a temp name and renamed over
+    LOG_FILE, so a crash leaves either the old log or the new one, never a
+    truncated mix.
+    """
+    tmp_path = LOG_FILE + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"".join(lines))
+        f.flush()
+        os.fsync(f.fileno())
+    # Dropped before the rename: a crash in between must not leave evicted
+    # entries in LOG_FILE_PREV to be read back in front of the new log
+    _remove_prev_segment()
+    os.replace(tmp_path, LOG_FILE)
+
+
+def _remove_prev_segment():
+    try:
+        os.remove(LOG_FILE_PREV)
+    except FileNotFoundError:
+        pass
+
+
 def load_settings(defaults: dict) -> dict:
     """Load settings from settings.json, falling back to defaults if missing/corrupt."""
     if not os.path.exists(SETTINGS_FILE):
@@ -151,20 +252,239 @@ def flush_settings():
             _pending_settings = None
 
 
-def delete_oldest_detection(detection_history: List[dict]) -> None:
-    """Delete the oldest detection image and remove from history."""
-    if not detection_history:
-        return
+IMAGE_WRITE_QUEUE_SIZE = 64  # Max queued image writes/unlinks waiting for the disk writer
+LOG_FLUSH_BATCH = 8  # fsync the detection log after this many queued entries...
+LOG_FLUSH_INTERVAL = 0.2  # ...or once the oldest unflushed entry is this many seconds old
+
+_image_q = queue.Queue(maxsize=IMAGE_WRITE_QUEUE_SIZE)
+_disk_writer_started = False
+_log_fh = None  # Append handle to LOG_FILE, opened lazily and owned by the disk writer thread
+_log_active_lines = 0  # Lines in LOG_FILE, counted when _log_fh is opened (writer thread only)
+
+
+def _queue_disk_op(op: str, path: str, data) -> bool:
+    """Hand a log operation to the writer. False means: no writer yet, do it inline.
+
+    Once the writer runs it owns the log handle, so a write done here around it
+    would land out of order and miss its line count; if the queue stays full
+    the operation is dropped instead.
+    """
+    if not _disk_writer_started:
+        return False
+    try:
+        _image_q.put((op, path, data), timeout=1.0)
+    except queue.Full:
+        print(f"[HISTORY] Disk writer queue full, dropping {op}")
+    return True
+
 
-    oldest = detection_history.pop(0)
-    image_path = os.path.join(IMAGES_DIR, oldest.get("filename", ""))
+def _close_log_handle():
+    """Close the writer's log handle (before a rewrite, or after an I/O error)."""
+    global _log_fh
+    if _log_fh is not None:
+        try:
+            _log_fh.close()
+        except Exception:
+            pass
+        _log_fh = None
 
+
+def _count_log_lines() -> int:
     try:
-        if os.path.exists(image_path):
-            os.remove(image_path)
-            print(f"[HISTORY] Deleted oldest image: {oldest.get('filename')}")
+        with open(LOG_FILE, "rb") as f:
+            return sum(1 for _ in f)
+    except FileNotFoundError:
+        return 0
+
+
+def _writev_all(fd: int, bufs: List[bytes]):
+    """Write every buffer with scatter-gather writev, resuming after a short write."""
+    while bufs:
+        written = os.writev(fd, bufs)
+        while bufs and written >= len(bufs[0]):
+            written -= len(bufs[0])
+            bufs = bufs[1:]
+        if bufs and written:
+            bufs = [bufs[0][written:]] + bufs[1:]
+
+
+def _append_log_batch(lines: List[bytes]):
+    """Append lines through the kept-open handle: one writev + fsync, no open/close per batch.
+
+    When LOG_FILE reaches MAX_DETECTION_IMAGES lines it becomes LOG_FILE_PREV
+    (replacing the older segment), which alone still covers the live window.
+    """
+    global _log_fh, _log_active_lines
+    if _log_fh is None:
+        _log_active_lines = _count_log_lines()
+        # Unbuffered: writes go straight to writev, so nothing sits in a Python buffer
+        _log_fh = open(LOG_FILE, "ab", buffering=0)
+    try:
+        # One writev hands the kernel the lines as an iovec, no joined copy needed
+        _writev_all(_log_fh.fileno(), lines)
+        os.fsync(_log_fh.fileno())
+    except Exception:
+        # Reopen on the next batch rather than keep writing to a broken handle
+        _close_log_handle()
+        raise
+    _log_active_lines += len(lines)
+    if _log_active_lines >= MAX_DETECTION_IMAGES:
+        _close_log_handle()
+        os.replace(LOG_FILE, LOG_FILE_PREV)
+
+
+def _flush_log_batch(pending: List[bytes]):
+    """Append buffered log lines with one fsync and mark their queue items done."""
+    try:
+        _append_log_batch(pending)
     except Exception as e:
-        print(f"[HISTORY] Error deleting image: {e}")
+        print(f"[HISTORY] Error saving to log: {e}")
+    finally:
+        for _ in pending:
+            _image_q.task_done()
+        pending.clear()
+
+
+def _write_image(path: str, data):
+    """Write an image (bytes, or a callable returning them) under a temp name, then rename."""
+    if callable(data):
+        # Deferred encode: the image is rendered here, off the detection thread
+        data = data()
+    # Write to a temp name first so the WebUI never serves a partial image
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _disk_writer_loop():
+    """Background writer: persist and delete detection images and log lines off the detection thread."""
+    pending_log: List[bytes] = []
+    log_deadline = 0.0
+    while True:
+        timeout = max(0.0, log_deadline - time.monotonic()) if pending_log else None
+        try:
+            op, path, data = _image_q.get(timeout=timeout)
+        except queue.Empty:
+            _flush_log_batch(pending_log)
+            continue
+
+        if op == "detection":
+            # The log line joins the batch only once its image is on disk
+            image, line, on_error = data
+            try:
+                _write_image(path, image)
+            except Exception as e:
+                print(f"[HISTORY] Error during write of {path}: {e}")
+                if on_error is not None:
+                    try:
+                        on_error()
+                    except Exception as cb_err:
+                        print(f"[HISTORY] Error handling failed write of {path}: {cb_err}")
+                _image_q.task_done()
+                continue
+            op, data = "log", line
+
+        if op == "log":
+            # Completed (task_done) only once the batch reaches disk, so
+            # flush_pending_writes() also waits for buffered lines
+            if not pending_log:
+                log_deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+            pending_log.append(data)
+            if len(pending_log) >= LOG_FLUSH_BATCH:
+                _flush_log_batch(pending_log)
+            continue
+
+        try:
+            if op == "rewrite":
+                # The snapshot already holds every buffered append
+                for _ in pending_log:
+                    _image_q.task_done()
+                pending_log.clear()
+                _close_log_handle()
+                _replace_log_file(data)
+                continue
+            if op == "unlink":
+                try:
+                    os.remove(path)
+                    print(f"[HISTORY] Deleted oldest image: {os.path.basename(path)}")
+                except FileNotFoundError:
+                    pass
+                continue
+            _write_image(path, data)
+        except Exception as e:
+            print(f"[HISTORY] Error during {op} of {path}: {e}")
+        finally:
+            _image_q.task_done()
+
+
+def start_disk_writer():
+    """Start the background image writer thread once."""
+    global _disk_writer_started
+    if _disk_writer_started:
+        return
+    _disk_writer_started = True
+    threading.Thread(target=_disk_writer_loop, daemon=True).start()
+
+
+def queue_detection_write(path: str, data, entry: dict, on_error: Optional[Callable[[], None]] = None) -> bool:
+    """Queue a detection image and its log entry for the writer. Returns False if the queue is full.
+
+    data is the encoded bytes, or a zero-argument callable that returns them;
+    a callable is invoked on the writer thread so encoding stays off the caller.
+    The pair takes a single queue slot, so it is accepted or rejected as a whole
+    without blocking the caller, and the log line is appended only after the
+    image was written. If rendering or writing fails, the line is dropped and
+    on_error is called on the writer thread so the caller can forget the entry.
+    """
+    try:
+        _image_q.put_nowait(("detection", path, (data, _dumps_log_line(entry), on_error)))
+        return True
+    except queue.Full:
+        print(f"[HISTORY] Image write queue full, dropping {os.path.basename(path)}")
+        return False
+
 
-    rewrite_log_file(detection_history)
+def flush_pending_writes(timeout: float = 5.0):
+    """Wait (bounded) for queued image and log writes to reach disk. Call this on shutdown."""
+    with _image_q.all_tasks_done:
+        _image_q.all_tasks_done.wait_for(lambda: _image_q.unfinished_tasks == 0, timeout)
+
+
+def delete_oldest_detections(detection_history: Deque[dict], n: int) -> List[str]:
+    """Remove the n oldest detections and queue their images for deletion.
+
+    The log is not touched: evicted entries age out with their log segment.
+
+    Returns the removed filenames.
+    """
+    n = min(n, len(detection_history))
+    if n <= 0:
+        return []
+
+    removed = [detection_history.popleft() for _ in range(n)]
+    filenames = [entry.get("filename", "") for entry in removed]
+
+    for filename in filenames:
+        if not filename:
+            continue
+        image_path = os.path.join(IMAGES_DIR, filename)
+        try:
+            # Blocking put: dropping an unlink would leak the file on disk
+            _image_q.put(("unlink", image_path, None), timeout=1.0)
+        except queue.Full:
+            print(f"[HISTORY] Image write queue full, deleting {filename} inline")
+            try:
+                os.remove(image_path)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"[HISTORY] Error deleting image: {e}")
+
+    return filenames
+
+
+def delete_oldest_detection(detection_history: Deque[dict]) -> None:
+    """Delete the oldest detection image and remove from history."""
+    delete_oldest_detections(detection_history, 1)
 
@@ -1,7 +1,7 @@
-from typing import List, Set
+from typing import Deque, List, Set
 
 
-def emit_detection_saved(ui, detection_history: List[dict], entry: dict):
+def emit_detection_saved(ui, detection_history: Deque[dict], entry: dict):
     """Notify UI that a new detection was saved."""
     payload = {
         "entry": entry,
@@ -13,10 +13,10 @@ def emit_detection_saved(ui, detection_history: List[dict], entry: dict):
         print(f"[UI] Failed to emit detection_saved: {e}")
 
 
-def emit_history_list(ui, detection_history: List[dict]):
+def emit_history_list(ui, detection_history: Deque[dict]):
     """Send full detection history list to UI."""
     payload = {
-        "history": detection_history,
+        "history": list(detection_history),  # deques are not JSON serializable
         "total": len(detection_history),
     }
     try:
@@ -34,10 +34,10 @@ def emit_threshold(ui, detection_confidence: float):
         print(f"[UI] Failed to emit threshold: {e}")
 
 
-def emit_detected_labels(ui, detected_labels: Set[str], detection_label: str):
-    """Broadcast the current detected label list and selected label to the UI."""
+def emit_detected_labels(ui, labels_sorted: List[str], detection_label: str):
+    """Broadcast the current detected label list (already sorted) and selected label to the UI."""
     labels_payload = {
-        "labels": sorted(detected_labels),
+        "labels": labels_sorted,
         "selected": detection_label.lower(),
     }
     try:
@@ -126,7 +126,7 @@ def handle_snapshot_request(ui, get_snapshot_fn, _sid, _value):
             print(f"[UI] Failed to emit snapshot error: {e}")
 
 
-def handle_image_request(ui, detection_history: List[dict], _sid, value):
+def handle_image_request(ui, detection_history: Deque[dict], _sid, value):
     """Send specific detection record by index."""
     try:
         index = int(value) if value is not None else -1
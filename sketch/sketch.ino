@@ -80,6 +80,12 @@ void playAnimation() {
   Monitor.flush();
 }
 
+// New detection: LED on + animation in a single Bridge round trip
+void detectionEvent() {
+  setLedState(true);
+  playAnimation();
+}
+
 void setup() {
   matrixBegin();
   pinMode(ledPin, OUTPUT);
@@ -91,6 +97,7 @@ void setup() {
   Monitor.begin();
   Bridge.provide("setLedState", setLedState);
   Bridge.provide("playAnimation", playAnimation);
+  Bridge.provide("detectionEvent", detectionEvent);
   Monitor.println("[C++] setup done, LED is OFF");
 }
 